@@ -55,7 +55,7 @@ OLLAMA_TIMEOUT=120
 
 # Storage
 STORAGE_FILE=tasks_db.json
-LOGS_FILE=execution_logs.json
+LOGS_FILE=execution_logs.jsonl
 EOF
 
 echo -e "${GREEN}✓${NC} Updated .env with CPU-only configuration"
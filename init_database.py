@@ -1,219 +1,162 @@
 """
 Initialize Database with Sample Data
-Creates tasks_db.json and execution_logs.json with sample data
+Creates tasks_db.json and execution_logs.jsonl with sample data
 """
 
-import json
+import sys
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 
+# Status, priority, intent and model vocabulary shared by the sample tasks and logs.
+# Interning keeps one copy of each string and makes equality a pointer check.
+PENDING = sys.intern("pending")
+IN_PROGRESS = sys.intern("in_progress")
+COMPLETED = sys.intern("completed")
+HIGH = sys.intern("high")
+MEDIUM = sys.intern("medium")
+LOW = sys.intern("low")
+CREATE = sys.intern("create")
+UPDATE = sys.intern("update")
+ESCALATE = sys.intern("escalate")
+MODEL = sys.intern("mistral:latest")
+
+
 def create_sample_tasks():
-    """Generate sample tasks"""
+    """Generate sample tasks in the columnar (struct-of-arrays) database layout"""
     now = datetime.now()
-    
-    tasks = {
-        "TASK-0001": {
-            "id": "TASK-0001",
-            "title": "Review Q4 Financial Reports",
-            "description": "Comprehensive review of Q4 2024 financial reports and budget analysis",
-            "priority": "high",
-            "status": "in_progress",
-            "created_at": (now - timedelta(days=5)).isoformat(),
-            "updated_at": (now - timedelta(days=1)).isoformat(),
-            "history": [
-                {
-                    "timestamp": (now - timedelta(days=2)).isoformat(),
-                    "changes": {"status": "in_progress"}
-                }
-            ]
-        },
-        "TASK-0002": {
-            "id": "TASK-0002",
-            "title": "Update Product Documentation",
-            "description": "Update user documentation with latest feature releases",
-            "priority": "medium",
-            "status": "pending",
-            "created_at": (now - timedelta(days=3)).isoformat(),
-            "updated_at": (now - timedelta(days=3)).isoformat(),
-            "history": []
-        },
-        "TASK-0003": {
-            "id": "TASK-0003",
-            "title": "Client Meeting Preparation",
-            "description": "Prepare presentation and materials for Acme Corp meeting",
-            "priority": "high",
-            "status": "completed",
-            "created_at": (now - timedelta(days=7)).isoformat(),
-            "updated_at": (now - timedelta(days=1)).isoformat(),
-            "history": [
-                {
-                    "timestamp": (now - timedelta(days=6)).isoformat(),
-                    "changes": {"status": "in_progress"}
-                },
-                {
-                    "timestamp": (now - timedelta(days=1)).isoformat(),
-                    "changes": {"status": "completed"}
-                }
-            ]
-        },
-        "TASK-0004": {
-            "id": "TASK-0004",
-            "title": "Code Review - Authentication Module",
-            "description": "Review pull request for new authentication system",
-            "priority": "high",
-            "status": "pending",
-            "created_at": (now - timedelta(days=2)).isoformat(),
-            "updated_at": (now - timedelta(days=2)).isoformat(),
-            "history": []
-        },
-        "TASK-0005": {
-            "id": "TASK-0005",
-            "title": "Marketing Campaign Analysis",
-            "description": "Analyze performance metrics for Q1 marketing campaigns",
-            "priority": "medium",
-            "status": "in_progress",
-            "created_at": (now - timedelta(days=4)).isoformat(),
-            "updated_at": (now - timedelta(hours=12)).isoformat(),
-            "history": [
-                {
-                    "timestamp": (now - timedelta(hours=12)).isoformat(),
-                    "changes": {"status": "in_progress", "priority": "medium"}
-                }
-            ]
-        }
+    # Format each distinct offset once and reuse the ISO strings
+    ts = {
+        (days, hours): (now - timedelta(days=days, hours=hours)).isoformat()
+        for days, hours in [(7, 0), (6, 0), (5, 0), (4, 0), (3, 0), (2, 0), (1, 0), (0, 12)]
     }
     
+    # Each field is stored once as a column; row i of every column is task i
     return {
-        "tasks": tasks,
+        "ids": ["TASK-0001", "TASK-0002", "TASK-0003", "TASK-0004", "TASK-0005"],
+        "titles": [
+            "Review Q4 Financial Reports",
+            "Update Product Documentation",
+            "Client Meeting Preparation",
+            "Code Review - Authentication Module",
+            "Marketing Campaign Analysis"
+        ],
+        "descriptions": [
+            "Comprehensive review of Q4 2024 financial reports and budget analysis",
+            "Update user documentation with latest feature releases",
+            "Prepare presentation and materials for Acme Corp meeting",
+            "Review pull request for new authentication system",
+            "Analyze performance metrics for Q1 marketing campaigns"
+        ],
+        "priorities": [HIGH, MEDIUM, HIGH, HIGH, MEDIUM],
+        "statuses": [IN_PROGRESS, PENDING, COMPLETED, PENDING, IN_PROGRESS],
+        "created_at": [ts[(5, 0)], ts[(3, 0)], ts[(7, 0)], ts[(2, 0)], ts[(4, 0)]],
+        "updated_at": [ts[(1, 0)], ts[(3, 0)], ts[(1, 0)], ts[(2, 0)], ts[(0, 12)]],
+        "histories": [
+            [
+                {"timestamp": ts[(2, 0)], "changes": {"status": IN_PROGRESS}}
+            ],
+            [],
+            [
+                {"timestamp": ts[(6, 0)], "changes": {"status": IN_PROGRESS}},
+                {"timestamp": ts[(1, 0)], "changes": {"status": COMPLETED}}
+            ],
+            [],
+            [
+                {"timestamp": ts[(0, 12)], "changes": {"status": IN_PROGRESS, "priority": MEDIUM}}
+            ]
+        ],
         "counter": 5
     }
 
 
+def _trace(step: str, timestamp: str, **fields) -> dict:
+    """Build a trace step entry as produced by the workflow graph"""
+    return {"step": step, "timestamp": timestamp, **fields}
+
+
 def create_sample_logs():
     """Generate sample execution logs"""
     now = datetime.now()
+    # Format each distinct offset once and reuse the ISO strings
+    ts = {
+        (days, hours): (now - timedelta(days=days, hours=hours)).isoformat()
+        for days, hours in [(5, 0), (3, 0), (2, 0), (1, 0), (0, 6)]
+    }
     
     logs = [
         {
-            "timestamp": (now - timedelta(days=5)).isoformat(),
+            "timestamp": ts[(5, 0)],
             "input": "Create a high priority task to review Q4 financial reports",
-            "intent": "create",
+            "intent": CREATE,
             "task_id": "TASK-0001",
             "result": "✅ Task created successfully: TASK-0001",
             "trace": [
-                {
-                    "step": "intent_classifier",
-                    "timestamp": (now - timedelta(days=5)).isoformat(),
-                    "model": "mistral:latest",
-                    "output": {
-                        "intent": "create",
-                        "reasoning": "User wants to create a new high priority task"
-                    }
-                },
-                {
-                    "step": "create_update_task",
-                    "timestamp": (now - timedelta(days=5)).isoformat(),
-                    "action": "create",
-                    "task_id": "TASK-0001"
-                },
-                {
-                    "step": "confirm_and_log",
-                    "timestamp": (now - timedelta(days=5)).isoformat(),
-                    "final_result": "✅ Task created successfully: TASK-0001"
-                }
+                _trace("intent_classifier", ts[(5, 0)], model=MODEL, output={
+                    "intent": CREATE,
+                    "reasoning": "User wants to create a new high priority task"
+                }),
+                _trace("create_update_task", ts[(5, 0)], action=CREATE, task_id="TASK-0001"),
+                _trace("confirm_and_log", ts[(5, 0)],
+                       final_result="✅ Task created successfully: TASK-0001")
             ],
             "error": None
         },
         {
-            "timestamp": (now - timedelta(days=3)).isoformat(),
+            "timestamp": ts[(3, 0)],
             "input": "Create task to update product documentation",
-            "intent": "create",
+            "intent": CREATE,
             "task_id": "TASK-0002",
             "result": "✅ Task created successfully: TASK-0002",
             "trace": [
-                {
-                    "step": "intent_classifier",
-                    "timestamp": (now - timedelta(days=3)).isoformat(),
-                    "model": "mistral:latest"
-                },
-                {
-                    "step": "create_update_task",
-                    "timestamp": (now - timedelta(days=3)).isoformat(),
-                    "action": "create",
-                    "task_id": "TASK-0002"
-                }
+                _trace("intent_classifier", ts[(3, 0)], model=MODEL),
+                _trace("create_update_task", ts[(3, 0)], action=CREATE, task_id="TASK-0002")
             ],
             "error": None
         },
         {
-            "timestamp": (now - timedelta(days=2)).isoformat(),
+            "timestamp": ts[(2, 0)],
             "input": "Update TASK-0001 status to in_progress",
-            "intent": "update",
+            "intent": UPDATE,
             "task_id": "TASK-0001",
             "result": "✅ Task updated successfully: TASK-0001",
             "trace": [
-                {
-                    "step": "intent_classifier",
-                    "timestamp": (now - timedelta(days=2)).isoformat(),
-                    "model": "mistral:latest",
-                    "output": {
-                        "intent": "update",
-                        "reasoning": "User wants to update existing task status"
-                    }
-                },
-                {
-                    "step": "create_update_task",
-                    "timestamp": (now - timedelta(days=2)).isoformat(),
-                    "action": "update",
-                    "task_id": "TASK-0001",
-                    "updates": {"status": "in_progress"}
-                }
+                _trace("intent_classifier", ts[(2, 0)], model=MODEL, output={
+                    "intent": UPDATE,
+                    "reasoning": "User wants to update existing task status"
+                }),
+                _trace("create_update_task", ts[(2, 0)], action=UPDATE, task_id="TASK-0001",
+                       updates={"status": IN_PROGRESS})
             ],
             "error": None
         },
         {
-            "timestamp": (now - timedelta(days=1)).isoformat(),
+            "timestamp": ts[(1, 0)],
             "input": "Update TASK-0003 status to completed",
-            "intent": "update",
+            "intent": UPDATE,
             "task_id": "TASK-0003",
             "result": "✅ Task updated successfully: TASK-0003",
             "trace": [
-                {
-                    "step": "intent_classifier",
-                    "timestamp": (now - timedelta(days=1)).isoformat(),
-                    "model": "mistral:latest"
-                },
-                {
-                    "step": "create_update_task",
-                    "timestamp": (now - timedelta(days=1)).isoformat(),
-                    "action": "update",
-                    "task_id": "TASK-0003",
-                    "updates": {"status": "completed"}
-                }
+                _trace("intent_classifier", ts[(1, 0)], model=MODEL),
+                _trace("create_update_task", ts[(1, 0)], action=UPDATE, task_id="TASK-0003",
+                       updates={"status": COMPLETED})
             ],
             "error": None
         },
         {
-            "timestamp": (now - timedelta(hours=6)).isoformat(),
+            "timestamp": ts[(0, 6)],
             "input": "I need help planning the entire Q2 marketing strategy",
-            "intent": "escalate",
+            "intent": ESCALATE,
             "task_id": None,
             "result": "⚠️ Request escalated to human review",
             "trace": [
-                {
-                    "step": "intent_classifier",
-                    "timestamp": (now - timedelta(hours=6)).isoformat(),
-                    "model": "mistral:latest",
-                    "output": {
-                        "intent": "escalate",
-                        "reasoning": "Complex request requiring human expertise and strategic planning"
-                    }
-                },
-                {
-                    "step": "escalate_to_human",
-                    "timestamp": (now - timedelta(hours=6)).isoformat(),
-                    "reason": "Complex request requiring human expertise and strategic planning"
-                }
+                _trace("intent_classifier", ts[(0, 6)], model=MODEL, output={
+                    "intent": ESCALATE,
+                    "reasoning": "Complex request requiring human expertise and strategic planning"
+                }),
+                _trace("escalate_to_human", ts[(0, 6)],
+                       reason="Complex request requiring human expertise and strategic planning")
             ],
             "error": None
         }
@@ -222,44 +165,72 @@ def create_sample_logs():
     return logs
 
 
+# Userspace buffer for database files (1 MiB instead of the 8 KiB default)
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def write_json(filepath: str, data):
+    """Serialize data in memory, then write it with a single write() call"""
+    payload = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    with open(filepath, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(payload)
+
+
+def write_jsonl(filepath: str, records: list):
+    """Serialize records as newline-delimited JSON with a single write() call"""
+    payload = b"".join(orjson.dumps(record) + b"\n" for record in records)
+    with open(filepath, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(payload)
+
+
+_STATUS_EMOJI = {
+    "pending": "⏳",
+    "in_progress": "🔄",
+    "completed": "✅",
+    "escalated": "⚠️"
+}
+
+_PRIORITY_EMOJI = {
+    "low": "🔵",
+    "medium": "🟡",
+    "high": "🔴"
+}
+
+
 def initialize_databases():
     """Initialize both database files"""
     print("🔧 Initializing Database Files")
     print("=" * 60)
     
-    # Create tasks database
-    print("\n📝 Creating tasks_db.json...")
     tasks_data = create_sample_tasks()
-    with open("tasks_db.json", "w") as f:
-        json.dump(tasks_data, f, indent=2)
-    print(f"✅ Created with {len(tasks_data['tasks'])} sample tasks")
-    
-    # Create execution logs
-    print("\n📊 Creating execution_logs.json...")
     logs_data = create_sample_logs()
-    with open("execution_logs.json", "w") as f:
-        json.dump(logs_data, f, indent=2)
-    print(f"✅ Created with {len(logs_data)} sample log entries")
+    
+    # The two files are independent, so write them concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        tasks_write = executor.submit(write_json, "tasks_db.json", tasks_data)
+        logs_write = executor.submit(write_jsonl, "execution_logs.jsonl", logs_data)
+        
+        # Create tasks database
+        print("\n📝 Creating tasks_db.json...")
+        tasks_write.result()
+        print(f"✅ Created with {len(tasks_data['ids'])} sample tasks")
+        
+        # Create execution logs
+        print("\n📊 Creating execution_logs.jsonl...")
+        logs_write.result()
+        print(f"✅ Created with {len(logs_data)} sample log entries")
     
     print("\n" + "=" * 60)
     print("✅ Database initialization complete!")
     print("\nSample tasks created:")
-    for task_id, task in tasks_data["tasks"].items():
-        status_emoji = {
-            "pending": "⏳",
-            "in_progress": "🔄",
-            "completed": "✅",
-            "escalated": "⚠️"
-        }.get(task["status"], "📌")
-        
-        priority_emoji = {
-            "low": "🔵",
-            "medium": "🟡",
-            "high": "🔴"
-        }.get(task["priority"], "⚪")
+    for task_id, title, priority, status in zip(
+        tasks_data["ids"], tasks_data["titles"], tasks_data["priorities"], tasks_data["statuses"]
+    ):
+        status_emoji = _STATUS_EMOJI.get(status, "📌")
+        priority_emoji = _PRIORITY_EMOJI.get(priority, "⚪")
         
-        print(f"  {status_emoji} {task_id}: {task['title']}")
-        print(f"     Priority: {priority_emoji} {task['priority']} | Status: {task['status']}")
+        print(f"  {status_emoji} {task_id}: {title}")
+        print(f"     Priority: {priority_emoji} {priority} | Status: {status}")
     
     print("\n💡 Next steps:")
     print("  1. Run: python workflow_agent.py")
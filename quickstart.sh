@@ -149,7 +149,7 @@ TEMPERATURE=0.1
 
 # Storage
 STORAGE_FILE=tasks_db.json
-LOGS_FILE=execution_logs.json
+LOGS_FILE=execution_logs.jsonl
 EOF
     
     echo -e "${GREEN}✓${NC} .env file created with model: $SELECTED_MODEL"
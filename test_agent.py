@@ -5,8 +5,13 @@ Tests all components: LangGraph, API, and database
 
 import asyncio
 import json
+import orjson
 from datetime import datetime
-from workflow_agent import WorkflowAgent, run_workflow, print_result, TaskDatabase
+from workflow_agent import (
+    Config, WorkflowAgent, run_workflow, run_workflow_batch, print_result,
+    ClassificationCache, classification_cache, create_initial_state, get_default_agent,
+    TaskDatabase, SQLiteTaskDatabase, ExecutionLogger
+)
 
 
 def test_header(title: str):
@@ -28,7 +33,7 @@ def test_ollama_connection():
     try:
         response = httpx.get(f"{ollama_url}/api/tags", timeout=5.0)
         if response.status_code == 200:
-            models = response.json().get("models", [])
+            models = orjson.loads(response.content).get("models", [])
             print(f"✓ Connected to Ollama at {ollama_url}")
             print(f"✓ Available models: {len(models)}")
             for model in models:
@@ -46,11 +51,26 @@ def test_ollama_connection():
 
 
 def test_database():
-    """Test database operations"""
-    test_header("DATABASE TESTS")
+    """Test database operations on every storage backend"""
+    import os
+    import tempfile
     
-    db = TaskDatabase("test_tasks.json")
+    for backend, filename in ((TaskDatabase, "test_tasks.json"), (SQLiteTaskDatabase, "test_tasks.sqlite3")):
+        test_header(f"DATABASE TESTS ({backend.__name__})")
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = backend(os.path.join(tmp_dir, filename))
+            try:
+                check_database(db)
+            finally:
+                if isinstance(db, SQLiteTaskDatabase):
+                    db.conn.close()
     
+    print("🎉 All database tests passed!\n")
+
+
+def check_database(db):
+    """Run the database checks against one backend"""
     # Test 1: Create task
     print("✓ Test 1: Create Task")
     task = db.create_task(
@@ -68,6 +88,7 @@ def test_database():
     retrieved = db.get_task("TASK-0001")
     print(f"  Retrieved: {retrieved['title']}")
     assert retrieved['title'] == "Test Task"
+    assert db.get_task("TASK-9999") is None
     print("  PASSED ✓\n")
     
     # Test 3: Update task
@@ -79,27 +100,150 @@ def test_database():
     print(f"  Updated status: {updated['status']}")
     assert updated['status'] == "in_progress"
     assert len(updated['history']) == 1
+    assert db.get_task("TASK-0001")['priority'] == "medium"
+    assert db.update_task("TASK-9999", {"status": "completed"}) is None
     print("  PASSED ✓\n")
     
     # Test 4: List tasks
     print("✓ Test 4: List Tasks")
+    db.create_task(title="Second Task", description="Created later")
     tasks = db.list_tasks()
     print(f"  Found {len(tasks)} tasks")
-    assert len(tasks) == 1
+    assert [t['id'] for t in tasks] == ["TASK-0002", "TASK-0001"]
+    assert [t['id'] for t in db.list_tasks(status="in_progress", limit=1)] == ["TASK-0001"]
+    print("  PASSED ✓\n")
+    
+    # Test 5: Status filtering, ordering and limits across several tasks
+    print("✓ Test 5: Filter and Limit Tasks")
+    db.create_task(title="Third Task", description="")
+    db.create_task(title="Fourth Task", description="")
+    db.update_task("TASK-0003", {"status": "completed"})
+    
+    def ids(tasks):
+        return [t['id'] for t in tasks]
+    
+    assert ids(db.list_tasks()) == ["TASK-0004", "TASK-0003", "TASK-0002", "TASK-0001"]
+    assert ids(db.list_tasks(status="pending")) == ["TASK-0004", "TASK-0002"]
+    assert ids(db.list_tasks(status="completed")) == ["TASK-0003"]
+    assert ids(db.list_tasks(status="escalated")) == []
+    assert db.list_tasks(limit=0) == []
+    assert ids(db.list_tasks(limit=1)) == ["TASK-0004"]
+    assert ids(db.list_tasks(status="pending", limit=1)) == ["TASK-0004"]
+    
+    # A status change moves the task between status lists, keeping creation order
+    db.update_task("TASK-0004", {"status": "completed"})
+    assert ids(db.list_tasks(status="pending")) == ["TASK-0002"]
+    assert ids(db.list_tasks(status="completed")) == ["TASK-0004", "TASK-0003"]
+    assert ids(db.list_tasks(status="completed", limit=1)) == ["TASK-0004"]
     print("  PASSED ✓\n")
     
-    # Test 5: Escalate task
-    print("✓ Test 5: Escalate Task")
+    # Test 6: Escalate task (escalation fields are stored outside the fixed columns)
+    print("✓ Test 6: Escalate Task")
     escalated = db.escalate_task("TASK-0001", "Test escalation")
     print(f"  Escalated: {escalated['status']}")
     assert escalated['status'] == "escalated"
+    stored = db.get_task("TASK-0001")
+    assert stored['escalation_reason'] == "Test escalation"
+    assert stored['escalated_at'] == escalated['escalated_at']
+    assert len(stored['history']) == 2
+    print("  PASSED ✓\n")
+    
+    # Test 7: Reset
+    print("✓ Test 7: Reset")
+    db.reset()
+    assert db.list_tasks() == []
+    assert db.create_task(title="After reset", description="")['id'] == "TASK-0001"
     print("  PASSED ✓\n")
+
+
+def test_execution_log_rotation():
+    """Test execution log appends, rotation and tail reads (no Ollama needed)"""
+    test_header("EXECUTION LOG ROTATION TEST")
     
-    # Cleanup
     import os
-    os.remove("test_tasks.json")
+    import tempfile
     
-    print("🎉 All database tests passed!\n")
+    saved = Config.LOG_MAX_ENTRIES, Config.LOG_ROTATE_EVERY
+    Config.LOG_MAX_ENTRIES, Config.LOG_ROTATE_EVERY = 3, 5
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            logger = ExecutionLogger(os.path.join(tmp_dir, "test_logs.jsonl"))
+            # Smaller than one line, so tail() has to stitch lines across chunks
+            logger.TAIL_CHUNK_SIZE = 8
+            
+            # The first flush rotates, then every 5th append: after 11 entries
+            # the last rotation (at entry 11) left exactly 3 lines
+            inputs = [f"run {i}" for i in range(11)]
+            for user_input in inputs:
+                logger.log_execution({"input": user_input})
+            
+            with open(logger.filepath, 'rb') as f:
+                line_count = sum(1 for _ in f)
+            print(f"  Lines after rotation: {line_count}")
+            assert line_count == Config.LOG_MAX_ENTRIES
+            
+            assert [log['input'] for log in logger.read_logs()] == inputs[-3:]
+            for n in (1, 2, 3):
+                assert [log['input'] for log in logger.read_logs(limit=n)] == inputs[-n:]
+            assert [log['input'] for log in logger.read_logs(limit=10)] == inputs[-3:]
+            assert logger.read_logs(limit=0) == []
+            
+            # Appends after a rotation are kept until the next one
+            logger.log_execution({"input": "run 11"})
+            assert [log['input'] for log in logger.read_logs(limit=2)] == ["run 10", "run 11"]
+    finally:
+        Config.LOG_MAX_ENTRIES, Config.LOG_ROTATE_EVERY = saved
+    
+    print("\n✓ Execution log rotation test PASSED\n")
+
+
+def test_classification_cache():
+    """Test intent classification memoization (no Ollama needed)"""
+    test_header("CLASSIFICATION CACHE TEST")
+    
+    # Test 1: LRU eviction
+    print("✓ Test 1: LRU Eviction")
+    cache = ClassificationCache(maxsize=2, ttl=60)
+    keys = [ClassificationCache.make_key("model", f"input {i}") for i in range(3)]
+    cache.set(keys[0], {"intent": "CREATE"})
+    cache.set(keys[1], {"intent": "UPDATE"})
+    assert cache.get(keys[0]) == {"intent": "CREATE"}   # keys[1] is now least recently used
+    cache.set(keys[2], {"intent": "ESCALATE"})
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == {"intent": "CREATE"}
+    assert cache.get(keys[2]) == {"intent": "ESCALATE"}
+    assert ClassificationCache.make_key("a", "input") != ClassificationCache.make_key("b", "input")
+    print("  PASSED ✓\n")
+    
+    # Test 2: TTL expiry
+    print("✓ Test 2: TTL Expiry")
+    expiring = ClassificationCache(maxsize=2, ttl=0)
+    expiring.set(keys[0], {"intent": "CREATE"})
+    assert expiring.get(keys[0]) is None
+    print("  PASSED ✓\n")
+    
+    # Test 3: Which inputs are cached
+    print("✓ Test 3: Cache Keys and Hits")
+    agent = get_default_agent()
+    _, _, cache_key, cached = agent._prepare_classification(create_initial_state("Update TASK-0001 to completed"))
+    assert cache_key is None and cached is None
+    
+    user_input = "Create a task to water the office plants"
+    _, _, cache_key, cached = agent._prepare_classification(create_initial_state(user_input))
+    assert cache_key == ClassificationCache.make_key(agent.model_name, user_input)
+    assert cached is None
+    
+    stored = {"intent": "CREATE", "reasoning": "cached", "extracted_data": {"title": "Water plants"}}
+    classification_cache.set(cache_key, stored)
+    try:
+        trace_entry, _, _, cached = agent._prepare_classification(create_initial_state(user_input))
+        assert cached == stored and cached["extracted_data"] is not stored["extracted_data"]
+        assert trace_entry["cached"] is True
+    finally:
+        classification_cache.clear()
+    print("  PASSED ✓\n")
+    
+    print("✓ Classification cache test PASSED\n")
 
 
 def test_workflow_create():
@@ -196,6 +340,11 @@ def test_execution_trace():
     assert 'intent_classifier' in steps
     assert 'confirm_and_log' in steps
     
+    # The run should be the most recent entry in the execution log
+    last_log = ExecutionLogger().read_logs(limit=1)[0]
+    assert last_log['input'] == result['input']
+    assert len(last_log['trace']) == len(result['execution_trace'])
+    
     print("\n✓ Execution trace test PASSED\n")
 
 
@@ -209,9 +358,11 @@ def test_task_history():
     print(f"Created task: {task_id}")
     
     # Update it multiple times
-    run_workflow(f"Update {task_id} priority to high")
-    run_workflow(f"Update {task_id} status to in_progress")
-    run_workflow(f"Update {task_id} status to completed")
+    run_workflow_batch([
+        f"Update {task_id} priority to high",
+        f"Update {task_id} status to in_progress",
+        f"Update {task_id} status to completed"
+    ])
     
     # Check history
     agent = WorkflowAgent()
@@ -292,8 +443,9 @@ async def test_api_endpoints():
             print("✓ Test 6: Get Execution Logs")
             response = await client.get(f"{base_url}/logs?limit=5")
             assert response.status_code == 200
-            data = response.json()
-            print(f"  Recent logs: {data['count']}")
+            logs = [json.loads(line) for line in response.text.splitlines()]
+            assert len(logs) <= 5
+            print(f"  Recent logs: {len(logs)}")
             print("  PASSED ✓\n")
             
             print("🎉 All API tests passed!\n")
@@ -344,6 +496,8 @@ def run_all_tests():
         
         # Core tests
         test_database()
+        test_execution_log_rotation()
+        test_classification_cache()
         
         # Workflow tests
         task_id = test_workflow_create()
@@ -372,7 +526,9 @@ def run_all_tests():
         print("  ✓ Database operations")
         print("  ✓ LangGraph workflows")
         print("  ✓ Intent classification")
+        print("  ✓ Classification cache")
         print("  ✓ Execution tracing")
+        print("  ✓ Execution log rotation")
         print("  ✓ Task history")
         print("  ✓ Edge cases")
         print("  ✓ API endpoints")
@@ -396,6 +552,8 @@ if __name__ == "__main__":
         tests = {
             "ollama": test_ollama_connection,
             "db": test_database,
+            "logs": test_execution_log_rotation,
+            "cache": test_classification_cache,
             "create": test_workflow_create,
             "escalate": test_workflow_escalate,
             "edge": test_edge_cases,
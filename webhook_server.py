@@ -6,13 +6,20 @@ Using Ollama for local LLM inference
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Optional
+from collections import OrderedDict
+import asyncio
+import httpx
+import orjson
 import uvicorn
-from datetime import datetime
 
 # Import the workflow agent
-from workflow_agent import WorkflowAgent, run_workflow, WorkflowState, TaskDatabase
+from workflow_agent import (
+    Config, WorkflowAgent, get_default_agent, get_default_graph, create_initial_state,
+    run_workflow_async, now_iso, TaskDatabase, ExecutionLogger
+)
 
 
 # ============================================================================
@@ -60,6 +67,91 @@ class WebhookPayload(BaseModel):
     timestamp: str
 
 
+# ============================================================================
+# HEALTH CHECK
+# ============================================================================
+
+# Latest health report and its pre-encoded body, refreshed in the background
+# so health probes never wait on Ollama
+_health_report: dict = {}
+_health_body: bytes = b"{}"
+
+# Long-lived client for Ollama probes, so keep-alive connections are reused
+ollama_client = httpx.AsyncClient(
+    base_url=Config.OLLAMA_BASE_URL,
+    timeout=2.0,
+    limits=httpx.Limits(max_keepalive_connections=10)
+)
+
+
+async def refresh_health():
+    """Probe Ollama and update the cached health report"""
+    global _health_report, _health_body
+    
+    ollama_url = Config.OLLAMA_BASE_URL
+    ollama_status = "unknown"
+    
+    try:
+        response = await ollama_client.get("/api/tags")
+        if response.status_code == 200:
+            ollama_status = "connected"
+            models = orjson.loads(response.content).get("models", [])
+            available_models = [m["name"] for m in models]
+        else:
+            ollama_status = "error"
+            available_models = []
+    except Exception:
+        ollama_status = "disconnected"
+        available_models = []
+    
+    _health_report = {
+        "status": "healthy",
+        "timestamp": now_iso(),
+        "service": "AI Workflow Automation Agent (Ollama Edition)",
+        "ollama": {
+            "status": ollama_status,
+            "url": ollama_url,
+            "available_models": available_models
+        }
+    }
+    _health_body = orjson.dumps(_health_report)
+
+
+async def poll_health():
+    """Refresh the health report every Config.HEALTH_POLL_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(Config.HEALTH_POLL_INTERVAL)
+        await refresh_health()
+
+
+class HealthCheckInterceptor:
+    """
+    ASGI middleware answering GET /health from the cached report
+    
+    Runs outside the FastAPI middleware and routing stack, so it sets the
+    CORS header itself.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/health" and scope["method"] == "GET":
+            body = _health_body
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"access-control-allow-origin", b"*")
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        await self.app(scope, receive, send)
+
+
 # ============================================================================
 # FASTAPI APP
 # ============================================================================
@@ -67,7 +159,8 @@ class WebhookPayload(BaseModel):
 app = FastAPI(
     title="AI Workflow Automation Agent API (Ollama Edition)",
     description="Webhook server for n8n integration using local Ollama models",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -79,57 +172,131 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize components
-agent = WorkflowAgent()
+# Added last so it is the outermost layer
+app.add_middleware(HealthCheckInterceptor)
+
+
+@app.on_event("startup")
+async def start_health_polling():
+    """Probe Ollama once, then keep the health report fresh in the background"""
+    await refresh_health()
+    app.state.health_poller = asyncio.create_task(poll_health())
+
+
+@app.on_event("shutdown")
+async def stop_health_polling():
+    """Stop the background health probe and close its client"""
+    app.state.health_poller.cancel()
+    await ollama_client.aclose()
+
+
+@app.on_event("startup")
+async def open_http_client():
+    """Create the pooled HTTP client shared by webhook callbacks"""
+    app.state.http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_keepalive_connections=100)
+    )
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    """Close the shared HTTP client"""
+    await app.state.http_client.aclose()
+
+
+def flush_storage():
+    """Write pending task and log changes to disk"""
+    agent.db.flush()
+    agent.logger.flush()
+
+
+async def flush_periodically():
+    """Write-behind loop: flush storage every Config.FLUSH_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(Config.FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(flush_storage)
+        except Exception as e:
+            # Pending changes stay queued and are retried on the next pass
+            print(f"⚠️  Write-behind flush failed: {e}")
+
+
+@app.on_event("startup")
+async def start_write_behind():
+    """Coalesce task and log writes into periodic flushes"""
+    TaskDatabase.write_behind = True
+    ExecutionLogger.write_behind = True
+    app.state.flusher = asyncio.create_task(flush_periodically())
+
+
+@app.on_event("shutdown")
+async def stop_write_behind():
+    """Stop the flush loop and write out anything still pending"""
+    app.state.flusher.cancel()
+    await asyncio.to_thread(flush_storage)
+
+
+# Initialize components (the same agent and graph back run_workflow_async)
+agent = get_default_agent()
+
+# Compiled graphs (each holding its agent) for non-default models, keyed by
+# model name, least recently used first. The name comes from the client, so the
+# cache is capped; an evicted graph is freed once its in-flight requests finish.
+_graph_cache: OrderedDict[str, Any] = OrderedDict()
+
+
+def get_model_graph(model: str):
+    """Return the compiled graph for a model, building it on first use"""
+    if model == Config.LIGHT_MODEL:
+        return get_default_graph()
+    
+    graph = _graph_cache.get(model)
+    if graph is None:
+        graph = _graph_cache[model] = WorkflowAgent(model=model).build_graph()
+        while len(_graph_cache) > Config.MODEL_CACHE_SIZE:
+            _graph_cache.popitem(last=False)
+    else:
+        _graph_cache.move_to_end(model)
+    return graph
 
 
 # ============================================================================
 # WEBHOOK ENDPOINTS
 # ============================================================================
 
-@app.post("/webhook/task", response_model=TaskResponse)
+# TaskResponse documents the schema only; the handler returns the dict directly
+# so the (unbounded) execution trace is not validated and re-serialized
+@app.post("/webhook/task", responses={200: {"model": TaskResponse}})
 async def webhook_task_handler(request: TaskRequest):
     """
     Main webhook endpoint for n8n
     Processes natural language task requests using Ollama
     """
+    # Request start time, computed once and reported in the response
+    start_ts = now_iso()
+    
     try:
-        # Create agent with specified model if provided
+        # Use the cached agent for the specified model if provided
         if request.model:
-            agent_instance = WorkflowAgent(model=request.model)
-            graph = agent_instance.build_graph()
-            
-            # Initial state
-            initial_state: WorkflowState = {
-                "input": request.input,
-                "task_id": None,
-                "intent": None,
-                "task_data": None,
-                "decision_reasoning": "",
-                "execution_result": "",
-                "execution_trace": [],
-                "requires_human": False,
-                "error": None
-            }
+            graph = get_model_graph(request.model)
             
-            result = graph.invoke(initial_state)
+            # Ollama is awaited and the storage nodes run on worker threads
+            result = await graph.ainvoke(create_initial_state(request.input))
         else:
             # Use default model
-            result = run_workflow(request.input)
+            result = await run_workflow_async(request.input)
         
         # Build response
-        response = TaskResponse(
-            success=result.get("error") is None,
-            task_id=result.get("task_id"),
-            intent=result.get("intent"),
-            result=result.get("execution_result", ""),
-            reasoning=result.get("decision_reasoning", ""),
-            requires_human=result.get("requires_human", False),
-            execution_trace=result.get("execution_trace", []),
-            timestamp=datetime.now().isoformat()
-        )
-        
-        return response
+        return ORJSONResponse({
+            "success": result.get("error") is None,
+            "task_id": result.get("task_id"),
+            "intent": result.get("intent"),
+            "result": result.get("execution_result", ""),
+            "reasoning": result.get("decision_reasoning", ""),
+            "requires_human": result.get("requires_human", False),
+            "execution_trace": result.get("execution_trace", []),
+            "timestamp": start_ts
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -156,34 +323,42 @@ async def webhook_task_async(request: TaskRequest, background_tasks: BackgroundT
 
 async def process_async_task(user_input: str, webhook_url: str):
     """Process task asynchronously and send result to webhook"""
-    import httpx
+    client = app.state.http_client
+    # Task start time, shared by the success and error callbacks
+    start_ts = now_iso()
     
     try:
-        # Run workflow
-        result = run_workflow(user_input)
+        # Run workflow without blocking the event loop
+        result = await run_workflow_async(user_input)
         
         # Prepare callback payload
         payload = WebhookPayload(
             task_id=result.get("task_id"),
             result=result.get("execution_result", ""),
             status="success" if result.get("error") is None else "error",
-            timestamp=datetime.now().isoformat()
+            timestamp=start_ts
         )
         
-        # Send to callback URL
-        async with httpx.AsyncClient() as client:
-            await client.post(webhook_url, json=payload.dict())
+        # Send to callback URL (encoded once by pydantic-core)
+        await client.post(
+            webhook_url,
+            content=payload.model_dump_json(),
+            headers={"Content-Type": "application/json"}
+        )
             
     except Exception as e:
         # Send error to callback
-        error_payload = {
-            "task_id": None,
-            "result": f"Error: {str(e)}",
-            "status": "error",
-            "timestamp": datetime.now().isoformat()
-        }
-        async with httpx.AsyncClient() as client:
-            await client.post(webhook_url, json=error_payload)
+        error_payload = WebhookPayload(
+            task_id=None,
+            result=f"Error: {str(e)}",
+            status="error",
+            timestamp=start_ts
+        )
+        await client.post(
+            webhook_url,
+            content=error_payload.model_dump_json(),
+            headers={"Content-Type": "application/json"}
+        )
 
 
 # ============================================================================
@@ -197,7 +372,8 @@ async def create_task_direct(task: TaskCreate):
     Useful for structured API calls
     """
     try:
-        result = agent.db.create_task(
+        result = await asyncio.to_thread(
+            agent.db.create_task,
             title=task.title,
             description=task.description,
             priority=task.priority
@@ -213,7 +389,7 @@ async def create_task_direct(task: TaskCreate):
 @app.get("/api/tasks/{task_id}")
 async def get_task(task_id: str):
     """Get a specific task"""
-    task = agent.db.get_task(task_id)
+    task = await asyncio.to_thread(agent.db.get_task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
     return task
@@ -222,12 +398,12 @@ async def get_task(task_id: str):
 @app.put("/api/tasks/{task_id}")
 async def update_task_direct(task_id: str, updates: TaskUpdate):
     """Update a task directly"""
-    update_dict = {k: v for k, v in updates.dict().items() if v is not None}
+    update_dict = updates.model_dump(exclude_none=True)
     
     if not update_dict:
         raise HTTPException(status_code=400, detail="No updates provided")
     
-    result = agent.db.update_task(task_id, update_dict)
+    result = await asyncio.to_thread(agent.db.update_task, task_id, update_dict)
     
     if not result:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
@@ -239,9 +415,9 @@ async def update_task_direct(task_id: str, updates: TaskUpdate):
 
 
 @app.get("/api/tasks")
-async def list_tasks(status: Optional[str] = None):
-    """List all tasks, optionally filtered by status"""
-    tasks = agent.db.list_tasks(status)
+async def list_tasks(status: Optional[str] = None, limit: Optional[int] = None):
+    """List tasks newest first, optionally filtered by status and capped at limit"""
+    tasks = await asyncio.to_thread(agent.db.list_tasks, status, limit)
     return {
         "count": len(tasks),
         "tasks": tasks
@@ -251,7 +427,7 @@ async def list_tasks(status: Optional[str] = None):
 @app.post("/api/tasks/{task_id}/escalate")
 async def escalate_task(task_id: str, reason: str = "Manual escalation"):
     """Escalate a task to human review"""
-    result = agent.db.escalate_task(task_id, reason)
+    result = await asyncio.to_thread(agent.db.escalate_task, task_id, reason)
     
     if not result:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
@@ -268,70 +444,45 @@ async def escalate_task(task_id: str, reason: str = "Manual escalation"):
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    # Check if Ollama is accessible
-    import httpx
-    import os
-    
-    ollama_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
-    ollama_status = "unknown"
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{ollama_url}/api/tags", timeout=2.0)
-            if response.status_code == 200:
-                ollama_status = "connected"
-                models = response.json().get("models", [])
-                available_models = [m["name"] for m in models]
-            else:
-                ollama_status = "error"
-                available_models = []
-    except:
-        ollama_status = "disconnected"
-        available_models = []
-    
-    return {
-        "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
-        "service": "AI Workflow Automation Agent (Ollama Edition)",
-        "ollama": {
-            "status": ollama_status,
-            "url": ollama_url,
-            "available_models": available_models
-        }
-    }
+    """Health check endpoint (GET is served by HealthCheckInterceptor)"""
+    return _health_report
 
 
 @app.get("/logs")
 async def get_logs(limit: int = 10):
-    """Get recent execution logs"""
-    import json
+    """Return the most recent execution logs as newline-delimited JSON"""
     try:
-        with open(agent.logger.filepath, 'r') as f:
-            logs = json.load(f)
-        return {
-            "count": len(logs),
-            "logs": logs[-limit:]
-        }
-    except Exception as e:
+        # Only the last `limit` raw lines are read; none are re-encoded
+        lines = await asyncio.to_thread(agent.logger.tail, limit)
+    except OSError as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return Response(b"".join(lines), media_type="application/x-ndjson")
+
+
+def reset_storage():
+    """Clear all tasks and logs"""
+    import os
+    
+    # Write out pending changes so they are not flushed into the fresh files
+    flush_storage()
+    
+    # Clear tasks
+    agent.db.reset()
+    
+    # Remove and reinitialize logs
+    try:
+        os.unlink(agent.logger.filepath)
+    except FileNotFoundError:
+        pass
+    agent.logger._ensure_file_exists()
 
 
 @app.delete("/reset")
 async def reset_database():
     """Reset the entire database (USE WITH CAUTION)"""
-    import os
-    
     try:
-        # Remove files
-        if os.path.exists(agent.db.filepath):
-            os.remove(agent.db.filepath)
-        if os.path.exists(agent.logger.filepath):
-            os.remove(agent.logger.filepath)
-        
-        # Reinitialize
-        agent.db._ensure_file_exists()
-        agent.logger._ensure_file_exists()
+        await asyncio.to_thread(reset_storage)
         
         return {
             "success": True,
@@ -354,15 +505,20 @@ if __name__ == "__main__":
     print("📍 API docs: http://localhost:8000/docs")
     print("📍 Health check: http://localhost:8000/health")
     print("="*60)
-    print(f"🤖 Default Ollama model: {os.getenv('OLLAMA_MODEL', 'mistral:latest')}")
+    print(f"🤖 Default Ollama model: {Config.LIGHT_MODEL}")
     print(f"🔗 Ollama URL: {os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')}")
     print("="*60)
     print("\n⚠️  Make sure Ollama is running: ollama serve")
     print("Available models: ollama list\n")
     
+    # Each worker process keeps its own in-memory copy of the task database
+    # and does not see other workers' writes, so extra workers are opt-in
     uvicorn.run(
-        app,
+        "webhook_server:app",
         host="0.0.0.0",
         port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("API_WORKERS", "1")),
         log_level="info"
     )
@@ -4,9 +4,19 @@ Complete implementation with LangGraph, Redis-like storage, and execution tracin
 Using Ollama with Mistral for local LLM inference
 """
 
+import asyncio
+import bisect
+import copy
+import hashlib
 import json
 import os
-from datetime import datetime
+import re
+import sqlite3
+import threading
+import time
+import orjson
+from collections import OrderedDict
+from pathlib import Path
 from typing import TypedDict, Literal, Annotated
 from enum import Enum
 
@@ -14,6 +24,7 @@ from enum import Enum
 from langgraph.graph import StateGraph, END
 from langchain_ollama import ChatOllama
 from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 
 
 # ============================================================================
@@ -26,12 +37,62 @@ class Config:
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral:latest")
     
-    # Storage settings
+    # Intent classification is a small JSON-emitting task, so it can run on a
+    # lighter (e.g. q4-quantized) model than OLLAMA_MODEL
+    LIGHT_MODEL = os.getenv("LIGHT_MODEL", OLLAMA_MODEL)
+    
+    # Model layers offloaded to the GPU: "auto" lets Ollama use any GPU it
+    # detects (falling back to CPU on CUDA errors), 0 forces CPU inference
+    OLLAMA_NUM_GPU = os.getenv("OLLAMA_NUM_GPU", "auto")
+    
+    # Storage settings ("json" file store or "sqlite")
+    STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
     STORAGE_FILE = os.getenv("STORAGE_FILE", "tasks_db.json")
-    LOGS_FILE = os.getenv("LOGS_FILE", "execution_logs.json")
+    SQLITE_FILE = os.getenv("SQLITE_FILE", "tasks_db.sqlite3")
+    LOGS_FILE = os.getenv("LOGS_FILE", "execution_logs.jsonl")
+    
+    # Execution logs kept after rotation, and appends between rotations
+    LOG_MAX_ENTRIES = int(os.getenv("LOG_MAX_ENTRIES", "100"))
+    LOG_ROTATE_EVERY = int(os.getenv("LOG_ROTATE_EVERY", "1000"))
+    
+    # Seconds between write-behind flushes of the task database and logs
+    FLUSH_INTERVAL = float(os.getenv("FLUSH_INTERVAL", "0.1"))
+    
+    # Seconds between background Ollama probes backing /health
+    HEALTH_POLL_INTERVAL = float(os.getenv("HEALTH_POLL_INTERVAL", "10"))
+    
+    # Concurrent Ollama calls allowed from async workflows (Ollama serves one at a time per model)
+    OLLAMA_CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY", "1"))
     
     # Model temperature (0 = deterministic, 1 = creative)
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.1"))
+    
+    # Agents kept by the API server for per-request model overrides
+    MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "4"))
+    
+    # Memoized intent classifications (entries, seconds to live)
+    CLASSIFIER_CACHE_SIZE = int(os.getenv("CLASSIFIER_CACHE_SIZE", "1024"))
+    CLASSIFIER_CACHE_TTL = float(os.getenv("CLASSIFIER_CACHE_TTL", "3600"))
+
+
+# ============================================================================
+# TIMESTAMPS
+# ============================================================================
+
+# Formatted date and time of the current second, as (epoch second, prefix)
+_iso_second: tuple[int, str] = (0, "")
+
+
+def now_iso() -> str:
+    """Local time as an ISO 8601 string with microseconds (like datetime.isoformat)"""
+    global _iso_second
+    second, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_second, prefix = _iso_second
+    # strftime runs once per second; other calls only format the microseconds
+    if second != cached_second:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(second))
+        _iso_second = (second, prefix)
+    return f"{prefix}.{micros:06d}"
 
 
 # ============================================================================
@@ -77,116 +138,405 @@ class WorkflowState(TypedDict):
 class TaskDatabase:
     """Simple JSON-based task storage (Redis-like interface)"""
     
+    # On-disk column name for each task field. tasks_db.json stores tasks as
+    # columns (struct-of-arrays) so each field name is written once, not once
+    # per task; any other fields go to a per-task "extras" dict.
+    COLUMNS = {
+        "id": "ids",
+        "title": "titles",
+        "description": "descriptions",
+        "priority": "priorities",
+        "status": "statuses",
+        "created_at": "created_at",
+        "updated_at": "updated_at",
+        "history": "histories"
+    }
+    
+    # Serializes mutations. Shared by all instances because workflows run on
+    # worker threads, each with its own database.
+    _lock = threading.RLock()
+    
+    # In-memory copy of each database file, keyed by absolute path. Instances
+    # for the same file share one copy, so reads only stat the file and
+    # every instance sees the others' writes.
+    _stores: dict[str, dict] = {}
+    
+    # Sorted (created_at, id) pairs for each file's tasks: all tasks under
+    # None and one list per status, so list_tasks needs no scan or sort
+    _indexes: dict[str, dict[str | None, list[tuple[str, str]]]] = {}
+    
+    # With write-behind enabled, mutations only mark the file dirty and
+    # flush() writes it, coalescing bursts of writes into one. The API server
+    # turns this on and flushes periodically; scripts write through.
+    write_behind = False
+    _dirty: set[str] = set()
+    
+    # (st_mtime_ns, st_size) of each file as last loaded or saved. Another
+    # process (e.g. the CLI next to the server) writing the file changes it,
+    # and _sync() reloads before the next read or mutation. Unflushed
+    # write-behind changes win over a concurrent external write.
+    _stats: dict[str, tuple[int, int] | None] = {}
+    
     def __init__(self, filepath: str = Config.STORAGE_FILE):
         self.filepath = filepath
-        self._ensure_file_exists()
+        self._key = os.path.abspath(filepath)
+        with self._lock:
+            if self._key not in self._stores:
+                self._ensure_file_exists()
+    
+    @property
+    def _data(self) -> dict:
+        """The shared in-memory database for this file"""
+        return self._stores[self._key]
+    
+    @staticmethod
+    def _snapshot(value):
+        """Deep copy of stored tasks, so callers never share the live store"""
+        return orjson.loads(orjson.dumps(value))
     
     def _ensure_file_exists(self):
-        """Create storage file if it doesn't exist"""
-        if not os.path.exists(self.filepath):
-            with open(self.filepath, 'w') as f:
-                json.dump({"tasks": {}, "counter": 0}, f, indent=2)
+        """Load the storage file into memory, (re)initializing it if missing or invalid"""
+        try:
+            with open(self.filepath, 'rb') as f:
+                stat = self._stat_key(os.fstat(f.fileno()))
+                data = orjson.loads(f.read())
+            # Columnar layout; files written before it are already row-shaped
+            db = self._from_columns(data) if "ids" in data else data
+            if not isinstance(db["tasks"], dict) or not isinstance(db["counter"], int):
+                raise ValueError("invalid task database")
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing, empty, corrupted or incomplete file
+            db = {"tasks": {}, "counter": 0}
+            self._save(db)
         else:
-            # Validate existing file
-            try:
-                with open(self.filepath, 'r') as f:
-                    content = f.read().strip()
-                    if not content:
-                        # Empty file, initialize
-                        with open(self.filepath, 'w') as fw:
-                            json.dump({"tasks": {}, "counter": 0}, fw, indent=2)
-                    else:
-                        data = json.loads(content)
-                        # Ensure required keys exist
-                        if "tasks" not in data or "counter" not in data:
-                            with open(self.filepath, 'w') as fw:
-                                json.dump({"tasks": {}, "counter": 0}, fw, indent=2)
-            except json.JSONDecodeError:
-                # Corrupted file, reinitialize
-                with open(self.filepath, 'w') as f:
-                    json.dump({"tasks": {}, "counter": 0}, f, indent=2)
-    
-    def _load(self) -> dict:
-        """Load database"""
+            self._stats[self._key] = stat
+        
+        self._stores[self._key] = db
+        self._indexes[self._key] = self._build_index(db["tasks"])
+    
+    @staticmethod
+    def _stat_key(st: os.stat_result) -> tuple[int, int]:
+        """The parts of a stat result that change when the file is rewritten"""
+        return st.st_mtime_ns, st.st_size
+    
+    def _sync(self):
+        """Reload the file if another process changed it since it was loaded or saved"""
+        if self._key in self._dirty:
+            return
         try:
-            with open(self.filepath, 'r') as f:
-                content = f.read().strip()
-                if not content:
-                    return {"tasks": {}, "counter": 0}
-                return json.loads(content)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {"tasks": {}, "counter": 0}
+            stat = self._stat_key(os.stat(self.filepath))
+        except FileNotFoundError:
+            stat = None
+        if stat != self._stats.get(self._key):
+            self._ensure_file_exists()
+    
+    @staticmethod
+    def _build_index(tasks: dict) -> dict[str | None, list[tuple[str, str]]]:
+        """Index tasks by creation time, overall and per status"""
+        index = {None: sorted((task["created_at"], task["id"]) for task in tasks.values())}
+        for entry in index[None]:
+            index.setdefault(tasks[entry[1]]["status"], []).append(entry)
+        return index
+    
+    def _index_add(self, task: dict):
+        """Add a task to the creation-time indexes"""
+        index = self._indexes[self._key]
+        entry = (task["created_at"], task["id"])
+        bisect.insort(index[None], entry)
+        bisect.insort(index.setdefault(task["status"], []), entry)
+    
+    def _index_remove(self, task_id: str, created_at: str, status: str):
+        """Remove a task from the creation-time indexes"""
+        index = self._indexes[self._key]
+        entry = (created_at, task_id)
+        for entries in (index[None], index[status]):
+            del entries[bisect.bisect_left(entries, entry)]
+    
+    @classmethod
+    def _to_columns(cls, db: dict) -> dict:
+        """Convert {"tasks": {id: task}, "counter": n} to the columnar layout"""
+        tasks = list(db["tasks"].values())
+        data = {
+            column: [task[field] for task in tasks]
+            for field, column in cls.COLUMNS.items()
+        }
+        extras = [
+            {k: v for k, v in task.items() if k not in cls.COLUMNS}
+            for task in tasks
+        ]
+        if any(extras):
+            data["extras"] = extras
+        data["counter"] = db["counter"]
+        return data
+    
+    @classmethod
+    def _from_columns(cls, data: dict) -> dict:
+        """Convert the columnar layout back to {"tasks": {id: task}, "counter": n}"""
+        fields = list(cls.COLUMNS)
+        columns = [data[column] for column in cls.COLUMNS.values()]
+        extras = data.get("extras") or [{} for _ in data["ids"]]
+        tasks = {}
+        for values, extra in zip(zip(*columns), extras):
+            task = dict(zip(fields, values))
+            task.update(extra)
+            tasks[task["id"]] = task
+        return {"tasks": tasks, "counter": data["counter"]}
     
     def _save(self, data: dict):
-        """Save database"""
-        with open(self.filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        """Save database (atomically, via a temporary file)"""
+        tmp_path = f"{self.filepath}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(self._to_columns(data)))
+            f.flush()
+            stat = self._stat_key(os.fstat(f.fileno()))
+        os.replace(tmp_path, self.filepath)
+        self._stats[self._key] = stat
+    
+    def _persist(self):
+        """Save the in-memory database now, or mark it dirty for flush()"""
+        if self.write_behind:
+            self._dirty.add(self._key)
+        else:
+            self._save(self._data)
+    
+    def flush(self):
+        """Write pending changes to disk"""
+        with self._lock:
+            if self._key in self._dirty:
+                self._save(self._data)
+                self._dirty.discard(self._key)
     
     def create_task(self, title: str, description: str, priority: str = "medium") -> dict:
         """Create a new task"""
-        db = self._load()
-        db["counter"] += 1
-        task_id = f"TASK-{db['counter']:04d}"
-        
-        task = {
-            "id": task_id,
-            "title": title,
-            "description": description,
-            "priority": priority,
-            "status": TaskStatus.PENDING.value,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-            "history": []
-        }
-        
-        db["tasks"][task_id] = task
-        self._save(db)
-        return task
+        with self._lock:
+            self._sync()
+            db = self._data
+            db["counter"] += 1
+            task_id = f"TASK-{db['counter']:04d}"
+            now = now_iso()
+            
+            task = {
+                "id": task_id,
+                "title": title,
+                "description": description,
+                "priority": priority,
+                "status": TaskStatus.PENDING.value,
+                "created_at": now,
+                "updated_at": now,
+                "history": []
+            }
+            
+            db["tasks"][task_id] = task
+            self._index_add(task)
+            self._persist()
+            return self._snapshot(task)
     
     def get_task(self, task_id: str) -> dict | None:
         """Get a task by ID"""
-        db = self._load()
-        return db["tasks"].get(task_id)
+        with self._lock:
+            self._sync()
+            task = self._data["tasks"].get(task_id)
+            return self._snapshot(task) if task else None
     
     def update_task(self, task_id: str, updates: dict) -> dict | None:
         """Update an existing task"""
-        db = self._load()
-        task = db["tasks"].get(task_id)
-        
-        if not task:
-            return None
-        
-        # Log history
-        task["history"].append({
-            "timestamp": datetime.now().isoformat(),
-            "changes": updates
+        with self._lock:
+            self._sync()
+            db = self._data
+            task = db["tasks"].get(task_id)
+            
+            if not task:
+                return None
+            
+            # Log history
+            now = now_iso()
+            task["history"].append({
+                "timestamp": now,
+                "changes": dict(updates)
+            })
+            
+            # Apply updates, re-indexing the task if its status or creation time changed
+            created_at, status = task["created_at"], task["status"]
+            task.update(updates)
+            task["updated_at"] = now
+            if (task["created_at"], task["status"]) != (created_at, status):
+                self._index_remove(task_id, created_at, status)
+                self._index_add(task)
+            
+            self._persist()
+            return self._snapshot(task)
+    
+    def list_tasks(self, status: str | None = None, limit: int | None = None) -> list[dict]:
+        """List tasks newest first, optionally filtered by status and capped at limit"""
+        with self._lock:
+            self._sync()
+            entries = self._indexes[self._key].get(status or None, [])
+            if limit is not None:
+                entries = entries[-limit:] if limit > 0 else []
+            
+            tasks = self._data["tasks"]
+            return self._snapshot([tasks[task_id] for _, task_id in reversed(entries)])
+    
+    def escalate_task(self, task_id: str, reason: str) -> dict | None:
+        """Mark task as escalated"""
+        return self.update_task(task_id, {
+            "status": TaskStatus.ESCALATED.value,
+            "escalation_reason": reason,
+            "escalated_at": now_iso()
         })
-        
-        # Apply updates
-        task.update(updates)
-        task["updated_at"] = datetime.now().isoformat()
-        
-        db["tasks"][task_id] = task
-        self._save(db)
+    
+    def reset(self):
+        """Delete all tasks and reset the counter"""
+        with self._lock:
+            try:
+                os.unlink(self.filepath)
+            except FileNotFoundError:
+                pass
+            self._ensure_file_exists()
+
+
+class SQLiteTaskDatabase:
+    """SQLite-backed task storage with the same interface as TaskDatabase"""
+    
+    # Task fields stored as their own columns; history and any other fields
+    # (e.g. escalation_reason) are stored as JSON
+    FIELDS = ("id", "title", "description", "priority", "status", "created_at", "updated_at")
+    
+    def __init__(self, filepath: str = Config.SQLITE_FILE):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(filepath, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._ensure_file_exists()
+    
+    def _ensure_file_exists(self):
+        """Create the schema if it doesn't exist"""
+        with self._lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id TEXT PRIMARY KEY,
+                    title TEXT,
+                    description TEXT,
+                    priority TEXT,
+                    status TEXT,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    history TEXT NOT NULL DEFAULT '[]',
+                    extras TEXT NOT NULL DEFAULT '{}'
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS tasks_created_at ON tasks (created_at)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS counter (n INTEGER NOT NULL)")
+            if self.conn.execute("SELECT 1 FROM counter").fetchone() is None:
+                self.conn.execute("INSERT INTO counter (n) VALUES (0)")
+    
+    def _to_task(self, row: sqlite3.Row) -> dict:
+        """Convert a tasks row to a task dict"""
+        task = {field: row[field] for field in self.FIELDS}
+        task["history"] = orjson.loads(row["history"])
+        task.update(orjson.loads(row["extras"]))
         return task
     
-    def list_tasks(self, status: str | None = None) -> list[dict]:
-        """List all tasks, optionally filtered by status"""
-        db = self._load()
-        tasks = list(db["tasks"].values())
-        
-        if status:
-            tasks = [t for t in tasks if t["status"] == status]
-        
-        return sorted(tasks, key=lambda x: x["created_at"], reverse=True)
+    def create_task(self, title: str, description: str, priority: str = "medium") -> dict:
+        """Create a new task"""
+        now = now_iso()
+        with self._lock, self.conn:
+            counter = self.conn.execute("UPDATE counter SET n = n + 1 RETURNING n").fetchone()[0]
+            task_id = f"TASK-{counter:04d}"
+            
+            task = {
+                "id": task_id,
+                "title": title,
+                "description": description,
+                "priority": priority,
+                "status": TaskStatus.PENDING.value,
+                "created_at": now,
+                "updated_at": now,
+                "history": []
+            }
+            
+            self.conn.execute(
+                "INSERT INTO tasks (id, title, description, priority, status, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [task[field] for field in self.FIELDS]
+            )
+            return task
+    
+    def get_task(self, task_id: str) -> dict | None:
+        """Get a task by ID"""
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._to_task(row) if row else None
+    
+    def update_task(self, task_id: str, updates: dict) -> dict | None:
+        """Update an existing task"""
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT * FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            
+            if not row:
+                return None
+            
+            task = self._to_task(row)
+            
+            # Log history
+            now = now_iso()
+            task["history"].append({
+                "timestamp": now,
+                "changes": updates
+            })
+            
+            # Apply updates
+            task.update(updates)
+            task["updated_at"] = now
+            
+            extras = {k: v for k, v in task.items() if k not in self.FIELDS and k != "history"}
+            self.conn.execute(
+                "UPDATE tasks SET title = ?, description = ?, priority = ?, status = ?,"
+                " created_at = ?, updated_at = ?, history = ?, extras = ? WHERE id = ?",
+                (
+                    task["title"], task["description"], task["priority"], task["status"],
+                    task["created_at"], task["updated_at"], orjson.dumps(task["history"]).decode(),
+                    orjson.dumps(extras).decode(),
+                    task_id
+                )
+            )
+            return task
+    
+    def list_tasks(self, status: str | None = None, limit: int | None = None) -> list[dict]:
+        """List tasks newest first, optionally filtered by status and capped at limit"""
+        # LIMIT -1 means no limit in SQLite
+        limit = -1 if limit is None else max(limit, 0)
+        with self._lock:
+            if status:
+                rows = self.conn.execute(
+                    "SELECT * FROM tasks WHERE status = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (status, limit)
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT * FROM tasks ORDER BY created_at DESC, id DESC LIMIT ?", (limit,)
+                ).fetchall()
+        return [self._to_task(row) for row in rows]
     
     def escalate_task(self, task_id: str, reason: str) -> dict | None:
         """Mark task as escalated"""
         return self.update_task(task_id, {
             "status": TaskStatus.ESCALATED.value,
             "escalation_reason": reason,
-            "escalated_at": datetime.now().isoformat()
+            "escalated_at": now_iso()
         })
+    
+    def flush(self):
+        """Nothing to do: every change is committed as it is made"""
+    
+    def reset(self):
+        """Delete all tasks and reset the counter"""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM tasks")
+            self.conn.execute("UPDATE counter SET n = 0")
 
 
 # ============================================================================
@@ -196,49 +546,99 @@ class TaskDatabase:
 class ExecutionLogger:
     """Logs execution traces"""
     
+    # Serializes rewrites of the log file across instances and threads
+    _lock = threading.Lock()
+    
+    # Encoded entries not yet written, keyed by absolute path. With
+    # write-behind enabled they are written by flush(); see TaskDatabase.
+    write_behind = False
+    _pending: dict[str, list[bytes]] = {}
+    
+    # Appends since the last rotation, keyed by absolute path. A path missing
+    # here has unknown history, so its first flush in a process rotates it.
+    _appended: dict[str, int] = {}
+    
+    # Bytes read per step when scanning the log file backwards
+    TAIL_CHUNK_SIZE = 1 << 16
+    
     def __init__(self, filepath: str = Config.LOGS_FILE):
         self.filepath = filepath
+        self._key = os.path.abspath(filepath)
         self._ensure_file_exists()
     
     def _ensure_file_exists(self):
         """Create logs file if it doesn't exist"""
-        if not os.path.exists(self.filepath):
-            with open(self.filepath, 'w') as f:
-                json.dump([], f)
+        Path(self.filepath).touch(exist_ok=True)
     
-    def log_execution(self, state: WorkflowState):
-        """Log a workflow execution"""
+    def read_logs(self, limit: int | None = None) -> list[dict]:
+        """Read logged executions (one JSON object per line), or only the last `limit`"""
+        if limit is not None:
+            return [orjson.loads(line) for line in self.tail(limit)]
         try:
-            with open(self.filepath, 'r') as f:
-                content = f.read().strip()
-                if not content:
-                    logs = []
-                else:
-                    logs = json.loads(content)
-        except (json.JSONDecodeError, FileNotFoundError):
-            # If file is corrupted or doesn't exist, start fresh
-            logs = []
-        
-        log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "input": state["input"],
-            "intent": state.get("intent"),
-            "task_id": state.get("task_id"),
-            "result": state.get("execution_result"),
-            "trace": state.get("execution_trace", []),
-            "error": state.get("error")
-        }
-        
-        logs.append(log_entry)
-        
-        # Keep only last 100 logs
-        logs = logs[-100:]
+            with open(self.filepath, 'rb') as f:
+                return [orjson.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+    
+    def tail(self, limit: int) -> list[bytes]:
+        """Return the last `limit` raw log lines, reading the file backwards"""
+        if limit <= 0:
+            return []
         
-        with open(self.filepath, 'w') as f:
-            json.dump(logs, f, indent=2)
+        try:
+            with open(self.filepath, 'rb') as f:
+                pos = f.seek(0, os.SEEK_END)
+                buf = b""
+                # Stop once the buffer holds `limit` complete lines
+                while pos > 0 and buf.count(b"\n") <= limit:
+                    step = min(self.TAIL_CHUNK_SIZE, pos)
+                    pos -= step
+                    f.seek(pos)
+                    buf = f.read(step) + buf
+        except FileNotFoundError:
+            return []
         
+        lines = buf.split(b"\n")
+        if pos > 0:
+            # The first piece may start mid-line
+            lines = lines[1:]
+        return [line + b"\n" for line in lines if line.strip()][-limit:]
+    
+    def _append(self, line: bytes):
+        """Queue an encoded entry and write it unless write-behind is on"""
+        with self._lock:
+            self._pending.setdefault(self._key, []).append(line)
+        if not self.write_behind:
+            self.flush()
+    
+    def flush(self):
+        """Append pending entries to the log file, rotating it periodically"""
+        with self._lock:
+            pending = self._pending.get(self._key)
+            if not pending:
+                return
+            
+            with open(self.filepath, 'ab') as f:
+                f.write(b"".join(pending))
+            del self._pending[self._key]
+            
+            appended = self._appended.get(self._key, Config.LOG_ROTATE_EVERY) + len(pending)
+            if appended >= Config.LOG_ROTATE_EVERY:
+                self._rotate()
+                appended = 0
+            self._appended[self._key] = appended
+    
+    def _rotate(self):
+        """Rewrite the log file with only its last Config.LOG_MAX_ENTRIES lines"""
+        tmp_path = f"{self.filepath}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(b"".join(self.tail(Config.LOG_MAX_ENTRIES)))
+        os.replace(tmp_path, self.filepath)
+    
+    def log_execution(self, state: WorkflowState, timestamp: str | None = None):
+        """Log a workflow execution"""
         log_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp or now_iso(),
             "input": state["input"],
             "intent": state.get("intent"),
             "task_id": state.get("task_id"),
@@ -247,57 +647,14 @@ class ExecutionLogger:
             "error": state.get("error")
         }
         
-        logs.append(log_entry)
-        
-        # Keep only last 100 logs
-        logs = logs[-100:]
-        
-        with open(self.filepath, 'w') as f:
-            json.dump(logs, f, indent=2)
+        self._append(orjson.dumps(log_entry) + b"\n")
 
 
 # ============================================================================
-# GRAPH NODES
+# PROMPTS
 # ============================================================================
 
-class WorkflowAgent:
-    """Main workflow automation agent"""
-    
-    def __init__(self, model: str = None):
-        """
-        Initialize the agent with specified Ollama model
-        
-        Args:
-            model: Ollama model name (mistral:latest, deepseek-coder:6.7b, gemma3:270m)
-        """
-        self.model_name = model or Config.OLLAMA_MODEL
-        
-        # Initialize Ollama LLM with CPU fallback
-        self.llm = ChatOllama(
-            base_url=Config.OLLAMA_BASE_URL,
-            model=self.model_name,
-            temperature=Config.TEMPERATURE,
-            # Increase timeout for CPU processing
-            request_timeout=120.0,
-            # Force CPU usage to avoid CUDA errors
-            num_gpu=0
-        )
-        
-        self.db = TaskDatabase()
-        self.logger = ExecutionLogger()
-        
-        print(f"🤖 Initialized agent with Ollama model: {self.model_name}")
-        print(f"🖥️  Using CPU inference (GPU disabled to prevent CUDA errors)")
-    
-    def intent_classifier(self, state: WorkflowState) -> WorkflowState:
-        """Classify the user's intent using Ollama LLM"""
-        trace_entry = {
-            "step": "intent_classifier",
-            "timestamp": datetime.now().isoformat(),
-            "model": self.model_name
-        }
-        
-        system_prompt = """You are an intent classifier for a task management system.
+SYSTEM_PROMPT = """You are an intent classifier for a task management system.
 
 Analyze the user's input and determine their intent:
 - CREATE: User wants to create a new task
@@ -329,66 +686,245 @@ Rules:
 
 Respond with ONLY the JSON object, nothing else."""
 
-        user_message = f"User input: {state['input']}"
+# Built once and shared by every classification
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+
+# ============================================================================
+# CLASSIFICATION CACHE
+# ============================================================================
+
+class ClassificationCache:
+    """Thread-safe LRU cache with a per-entry TTL for intent classifications"""
+    
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def make_key(model_name: str, user_input: str) -> bytes:
+        """Hash the model and input into a compact cache key"""
+        return hashlib.blake2b((model_name + "\0" + user_input).encode()).digest()
+    
+    def get(self, key: bytes) -> dict | None:
+        """Return a cached classification, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: bytes, value: dict):
+        """Store a classification, evicting the least recently used entry"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all cached classifications"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every agent so run_workflow's per-call agents hit the same cache
+classification_cache = ClassificationCache(Config.CLASSIFIER_CACHE_SIZE, Config.CLASSIFIER_CACHE_TTL)
+
+# Inputs referencing an existing task are not cached (their effect is not idempotent)
+TASK_ID_PATTERN = re.compile(r"TASK-\d+", re.IGNORECASE)
+
+# A whole LLM reply wrapped in a markdown code block, e.g. ```json ... ```
+CODE_FENCE_PATTERN = re.compile(r"^```(?:\w+)?\s*\n?(.*?)\n?```\s*$", re.DOTALL)
+
+# Guards ainvoke calls so concurrent async workflows queue for Ollama while the
+# rest of their pipeline (prompt build, JSON parsing, storage) overlaps
+ollama_semaphore = asyncio.Semaphore(Config.OLLAMA_CONCURRENCY)
+
+
+# ============================================================================
+# GRAPH NODES
+# ============================================================================
+
+class WorkflowAgent:
+    """Main workflow automation agent"""
+    
+    # Extracted fields an UPDATE intent may change
+    UPDATABLE_FIELDS = ("status", "priority", "description")
+    
+    def __init__(self, model: str = None):
+        """
+        Initialize the agent with specified Ollama model
+        
+        Args:
+            model: Ollama model name (mistral:latest, deepseek-coder:6.7b, gemma3:270m)
+        """
+        self.model_name = model or Config.LIGHT_MODEL
+        
+        # Initialize Ollama LLM, offloading to the GPU unless disabled
+        self.num_gpu = None if Config.OLLAMA_NUM_GPU == "auto" else int(Config.OLLAMA_NUM_GPU)
+        self.llm = self._build_llm(self.num_gpu)
+        
+        self.db = SQLiteTaskDatabase() if Config.STORAGE_BACKEND == "sqlite" else TaskDatabase()
+        self.logger = ExecutionLogger()
+        
+        print(f"🤖 Initialized agent with Ollama model: {self.model_name}")
+        if self.num_gpu == 0:
+            print("🖥️  Using CPU inference (GPU disabled)")
+        else:
+            print("⚡ GPU offload enabled (falls back to CPU on CUDA errors)")
+    
+    def _build_llm(self, num_gpu: int | None) -> ChatOllama:
+        """Create the Ollama client; num_gpu=None leaves GPU offload to Ollama"""
+        return ChatOllama(
+            base_url=Config.OLLAMA_BASE_URL,
+            model=self.model_name,
+            temperature=Config.TEMPERATURE,
+            # Increase timeout for CPU processing
+            request_timeout=120.0,
+            num_gpu=num_gpu,
+            # Constrain decoding to valid JSON (the classifier's only output)
+            format="json"
+        )
+    
+    def _fall_back_to_cpu(self, error: Exception) -> bool:
+        """Switch to CPU inference after a CUDA error; return whether to retry"""
+        if self.num_gpu == 0 or "cuda" not in str(error).lower():
+            return False
+        print(f"⚠️  CUDA error, falling back to CPU inference: {error}")
+        self.num_gpu = 0
+        self.llm = self._build_llm(0)
+        return True
+    
+    def intent_classifier(self, state: WorkflowState) -> WorkflowState:
+        """Classify the user's intent using Ollama LLM"""
+        trace_entry, messages, cache_key, cached = self._prepare_classification(state)
+        
+        try:
+            result = cached or self._classify_with_llm(messages)
+            self._apply_classification(state, trace_entry, result, cache_key, cached)
+        except Exception as e:
+            self._classification_failed(state, trace_entry, e)
+        
+        state["execution_trace"].append(trace_entry)
+        return state
+    
+    async def aintent_classifier(self, state: WorkflowState) -> WorkflowState:
+        """Classify the user's intent, awaiting Ollama without blocking the event loop"""
+        trace_entry, messages, cache_key, cached = self._prepare_classification(state)
+        
+        try:
+            result = cached or await self._aclassify_with_llm(messages)
+            self._apply_classification(state, trace_entry, result, cache_key, cached)
+        except Exception as e:
+            self._classification_failed(state, trace_entry, e)
+        
+        state["execution_trace"].append(trace_entry)
+        return state
+    
+    def _prepare_classification(self, state: WorkflowState) -> tuple[dict, list, bytes | None, dict | None]:
+        """Build the trace entry and prompt, and look up a cached classification"""
+        trace_entry = {
+            "step": "intent_classifier",
+            "timestamp": now_iso(),
+            "model": self.model_name
+        }
         
         messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_message)
+            SYSTEM_MESSAGE,
+            HumanMessage(content=f"User input: {state['input']}")
         ]
         
-        try:
-            response = self.llm.invoke(messages)
-            response_text = response.content.strip()
-            
-            # Clean up response - remove markdown code blocks if present
-            if response_text.startswith("```"):
-                # Extract JSON from code block
-                lines = response_text.split('\n')
-                json_lines = []
-                in_json = False
-                for line in lines:
-                    if line.strip().startswith("```"):
-                        in_json = not in_json
-                        continue
-                    if in_json or (not line.strip().startswith("```")):
-                        json_lines.append(line)
-                response_text = '\n'.join(json_lines).strip()
-            
-            # Parse LLM response
-            result = json.loads(response_text)
-            
-            state["intent"] = TaskAction(result["intent"].lower())
-            state["decision_reasoning"] = result["reasoning"]
-            state["task_data"] = result["extracted_data"]
-            
-            trace_entry["output"] = {
-                "intent": state["intent"],
-                "reasoning": state["decision_reasoning"]
-            }
-            
-        except json.JSONDecodeError as e:
+        cache_key = None
+        if not TASK_ID_PATTERN.search(state["input"]):
+            cache_key = ClassificationCache.make_key(self.model_name, state["input"])
+        cached = classification_cache.get(cache_key) if cache_key else None
+        if cached:
+            cached = copy.deepcopy(cached)
+            trace_entry["cached"] = True
+        
+        return trace_entry, messages, cache_key, cached
+    
+    def _apply_classification(self, state: WorkflowState, trace_entry: dict, result: dict,
+                              cache_key: bytes | None, cached: dict | None):
+        """Store a classification on the state and cache it if it came from the LLM"""
+        state["intent"] = TaskAction(result["intent"].lower())
+        state["decision_reasoning"] = result["reasoning"]
+        state["task_data"] = result["extracted_data"]
+        
+        if cache_key and not cached:
+            classification_cache.set(cache_key, copy.deepcopy({
+                "intent": result["intent"],
+                "reasoning": result["reasoning"],
+                "extracted_data": result["extracted_data"]
+            }))
+        
+        trace_entry["output"] = {
+            "intent": state["intent"],
+            "reasoning": state["decision_reasoning"]
+        }
+    
+    def _classification_failed(self, state: WorkflowState, trace_entry: dict, e: Exception):
+        """Escalate when the LLM response cannot be classified"""
+        if isinstance(e, json.JSONDecodeError):
             print(f"⚠️  JSON parsing error: {e}")
-            print(f"Response was: {response_text[:200]}...")
+            print(f"Response was: {e.doc[:200]}...")
             state["error"] = f"Failed to parse LLM response: {str(e)}"
-            state["intent"] = TaskAction.ESCALATE
             state["decision_reasoning"] = "Could not parse AI response"
-            trace_entry["error"] = str(e)
-            
-        except Exception as e:
+        else:
             print(f"⚠️  Intent classification error: {e}")
             state["error"] = f"Intent classification failed: {str(e)}"
-            state["intent"] = TaskAction.ESCALATE
             state["decision_reasoning"] = "Error during classification"
-            trace_entry["error"] = str(e)
+        state["intent"] = TaskAction.ESCALATE
+        trace_entry["error"] = str(e)
+    
+    def _classify_with_llm(self, messages: list) -> dict:
+        """Run the classifier prompt through Ollama and parse its JSON reply"""
+        try:
+            response = self.llm.invoke(messages)
+        except Exception as e:
+            if not self._fall_back_to_cpu(e):
+                raise
+            response = self.llm.invoke(messages)
+        return self._parse_classification(response.content)
+    
+    async def _aclassify_with_llm(self, messages: list) -> dict:
+        """Async variant of _classify_with_llm; parsing happens outside the semaphore"""
+        async with ollama_semaphore:
+            try:
+                response = await self.llm.ainvoke(messages)
+            except Exception as e:
+                if not self._fall_back_to_cpu(e):
+                    raise
+                response = await self.llm.ainvoke(messages)
+        return self._parse_classification(response.content)
+    
+    @staticmethod
+    def _parse_classification(content: str) -> dict:
+        """Strip markdown code fences from an LLM reply and parse the JSON inside"""
+        response_text = content.strip()
         
-        state["execution_trace"].append(trace_entry)
-        return state
+        # Clean up response - extract JSON from a markdown code block if present
+        # (format="json" should prevent these; kept for models that ignore it)
+        match = CODE_FENCE_PATTERN.match(response_text)
+        if match:
+            response_text = match.group(1)
+        
+        # Parse LLM response
+        return json.loads(response_text)
     
     def route_decision(self, state: WorkflowState) -> Literal["create_update", "escalate"]:
         """Route based on classified intent"""
         trace_entry = {
             "step": "route_decision",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso(),
             "decision": state["intent"]
         }
         state["execution_trace"].append(trace_entry)
@@ -401,7 +937,7 @@ Respond with ONLY the JSON object, nothing else."""
         """Create or update a task"""
         trace_entry = {
             "step": "create_update_task",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
         try:
@@ -428,14 +964,8 @@ Respond with ONLY the JSON object, nothing else."""
                     state["execution_result"] = "❌ Update failed: No task ID specified"
                     trace_entry["error"] = "No task ID"
                 else:
-                    # Build updates dict
-                    updates = {}
-                    if task_data.get("status"):
-                        updates["status"] = task_data["status"]
-                    if task_data.get("priority"):
-                        updates["priority"] = task_data["priority"]
-                    if task_data.get("description"):
-                        updates["description"] = task_data["description"]
+                    # Build updates dict from the fields the LLM filled in
+                    updates = {k: v for k in self.UPDATABLE_FIELDS if (v := task_data.get(k))}
                     
                     task = self.db.update_task(task_id, updates)
                     
@@ -462,7 +992,7 @@ Respond with ONLY the JSON object, nothing else."""
         """Escalate to human review"""
         trace_entry = {
             "step": "escalate_to_human",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
         state["requires_human"] = True
@@ -484,16 +1014,17 @@ Respond with ONLY the JSON object, nothing else."""
     
     def confirm_and_log(self, state: WorkflowState) -> WorkflowState:
         """Final confirmation and logging"""
+        now = now_iso()
         trace_entry = {
             "step": "confirm_and_log",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now,
             "final_result": state["execution_result"]
         }
         
         state["execution_trace"].append(trace_entry)
         
-        # Log execution
-        self.logger.log_execution(state)
+        # Log execution (stamped with the same time as the final trace step)
+        self.logger.log_execution(state, timestamp=now)
         
         return state
     
@@ -501,11 +1032,11 @@ Respond with ONLY the JSON object, nothing else."""
         """Build the LangGraph workflow"""
         workflow = StateGraph(WorkflowState)
         
-        # Add nodes
-        workflow.add_node("intent_classifier", self.intent_classifier)
-        workflow.add_node("create_update", self.create_update_task)
-        workflow.add_node("escalate", self.escalate_to_human)
-        workflow.add_node("confirm", self.confirm_and_log)
+        # Add nodes (under ainvoke, RunnableLambda runs the sync nodes on a worker thread)
+        workflow.add_node("intent_classifier", RunnableLambda(self.intent_classifier, afunc=self.aintent_classifier))
+        workflow.add_node("create_update", RunnableLambda(self.create_update_task))
+        workflow.add_node("escalate", RunnableLambda(self.escalate_to_human))
+        workflow.add_node("confirm", RunnableLambda(self.confirm_and_log))
         
         # Set entry point
         workflow.set_entry_point("intent_classifier")
@@ -534,13 +1065,9 @@ Respond with ONLY the JSON object, nothing else."""
 # MAIN EXECUTION
 # ============================================================================
 
-def run_workflow(user_input: str):
-    """Execute the workflow with given input"""
-    agent = WorkflowAgent()
-    graph = agent.build_graph()
-    
-    # Initial state
-    initial_state: WorkflowState = {
+def create_initial_state(user_input: str) -> WorkflowState:
+    """Build the initial graph state for a user input"""
+    return {
         "input": user_input,
         "task_id": None,
         "intent": None,
@@ -551,11 +1078,58 @@ def run_workflow(user_input: str):
         "requires_human": False,
         "error": None
     }
+
+
+# Default agent and compiled graph, built on first use and reused by every run
+_default_agent: WorkflowAgent | None = None
+_default_graph = None
+_default_lock = threading.Lock()
+
+
+def get_default_agent() -> WorkflowAgent:
+    """Return the shared agent for Config.LIGHT_MODEL, building it once"""
+    get_default_graph()
+    return _default_agent
+
+
+def get_default_graph():
+    """Return the compiled graph of the shared agent, building it once"""
+    global _default_agent, _default_graph
+    if _default_graph is None:
+        with _default_lock:
+            if _default_graph is None:
+                _default_agent = WorkflowAgent()
+                _default_graph = _default_agent.build_graph()
+    return _default_graph
+
+
+def run_workflow(user_input: str):
+    """Execute the workflow with given input"""
+    return get_default_graph().invoke(create_initial_state(user_input))
+
+
+async def run_workflow_async(user_input: str) -> WorkflowState:
+    """Execute the workflow without blocking the running event loop"""
+    return await get_default_graph().ainvoke(create_initial_state(user_input))
+
+
+def run_workflow_batch(user_inputs: list[str]) -> list[WorkflowState]:
+    """
+    Execute the workflow for several inputs in order on the shared graph
     
-    # Run the graph
-    result = graph.invoke(initial_state)
+    Storage writes are deferred for the whole batch and flushed once at the end.
+    """
+    agent = get_default_agent()
+    graph = get_default_graph()
     
-    return result
+    write_behind = TaskDatabase.write_behind, ExecutionLogger.write_behind
+    TaskDatabase.write_behind = ExecutionLogger.write_behind = True
+    try:
+        return [graph.invoke(create_initial_state(user_input)) for user_input in user_inputs]
+    finally:
+        TaskDatabase.write_behind, ExecutionLogger.write_behind = write_behind
+        agent.db.flush()
+        agent.logger.flush()
 
 
 def print_result(result: WorkflowState):
@@ -591,28 +1165,30 @@ def print_result(result: WorkflowState):
 if __name__ == "__main__":
     print("AI Workflow Automation Agent (Ollama Edition)")
     print("="*60)
-    print(f"Using model: {Config.OLLAMA_MODEL}")
+    print(f"Using model: {Config.LIGHT_MODEL}")
     print("="*60)
     
-    # Example 1: Create a task
-    print("\n🔹 Example 1: Create Task")
-    result1 = run_workflow("Create a high priority task to review Q4 financial reports")
-    print_result(result1)
+    examples = [
+        ("Example 1: Create Task", "Create a high priority task to review Q4 financial reports"),
+        ("Example 2: Update Task", "Update TASK-0001 status to in_progress"),
+        ("Example 3: Escalation", "I need help with something complex about project budgets and resource allocation")
+    ]
     
-    # Example 2: Update a task
-    print("\n🔹 Example 2: Update Task")
-    result2 = run_workflow("Update TASK-0001 status to in_progress")
-    print_result(result2)
+    async def run_examples():
+        # Example 2 updates the task Example 1 creates on a fresh database, so
+        # Example 1 runs first. The rest run concurrently: Ollama calls queue on
+        # ollama_semaphore while each workflow's parsing and storage overlap.
+        first = await run_workflow_async(examples[0][1])
+        rest = await asyncio.gather(*(run_workflow_async(user_input) for _, user_input in examples[1:]))
+        return [first, *rest]
     
-    # Example 3: Escalate
-    print("\n🔹 Example 3: Escalation")
-    result3 = run_workflow("I need help with something complex about project budgets and resource allocation")
-    print_result(result3)
+    for (label, _), result in zip(examples, asyncio.run(run_examples())):
+        print(f"\n🔹 {label}")
+        print_result(result)
     
     # View task database
     print("\n📋 Current Tasks in Database:")
-    agent = WorkflowAgent()
-    tasks = agent.db.list_tasks()
+    tasks = get_default_agent().db.list_tasks()
     for task in tasks:
         print(f"  • {task['id']}: {task['title']} [{task['status']}]")
     